@@ -1,59 +1,119 @@
 """Main CLI interface for commit-gpt."""
 
+import importlib.resources
 import os
+import re
 import subprocess
+import sys
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
 import typer
-from pydantic import BaseModel
 
-from .formatters import enforce_limits, format_casual, format_conventional
-from .gitio import current_branch, recent_subjects, repo_name, staged_diff, suggest_commit_groups
-from .llm import build_prompt, have_llm, is_diff_too_large, parse_llm_response, summarize_diff
-from .redact import estimate_tokens, scrub
-from .risk import assess
-
-
-def load_env_file():
-    """Automatically load .env file if it exists."""
-    # Look for .env in current directory and parent directories
-    current_dir = Path.cwd()
-    search_dirs = [current_dir] + list(current_dir.parents)
+from .gitio import (
+    collect_context,
+    commit_staged,
+    iter_staged_diff,
+    range_diff,
+    staged_diff,
+    suggest_commit_groups,
+)
+
+# Generic verbs that make a subject too vague for a very large diff
+# (also covers phrases like "add .env" and "update files")
+_POOR_MSG_RE = re.compile(r"\b(?:add|update|modify|change)\b", re.IGNORECASE)
+
+# Diffs above this many tokens need a specific commit message to be written
+_VERY_LARGE_TOKENS = 8000
+
+# Styled message prefixes
+_INFO = typer.style("[INFO]", fg=typer.colors.BLUE, bold=True)
+_HELP = typer.style("[HELP]", fg=typer.colors.GREEN, bold=True)
+_TIP = typer.style("[TIP]", fg=typer.colors.YELLOW, bold=True)
+_WARNING = typer.style("[WARNING]", fg=typer.colors.RED, bold=True)
+
+
+def _install_dir() -> Optional[str]:
+    """Return the checkout/install root that may hold a .env next to src/commit_gpt."""
+    package = importlib.resources.files("commit_gpt")
+    # Zip imports and other non-filesystem loaders have no directory to search
+    if not isinstance(package, Path):
+        return None
+    return str(package.parents[1])
+
+
+_INSTALL_DIR = _install_dir()
+
+# Every variable commit-gpt reads; .env is only skipped once all of them are set
+_ENV_KEYS = (
+    "OPENAI_API_KEY",
+    "ANTHROPIC_API_KEY",
+    "COMMIT_GPT_MAX_COST",
+    "COMMIT_GPT_OPENAI_MODEL",
+    "COMMIT_GPT_EXEC",
+    "EDITOR",
+)
+
+
+def _ancestors(path: str) -> Iterator[str]:
+    """Yield path and each of its parent directories up to the root."""
+    yield path
+    parent = os.path.dirname(path)
+    while parent != path:
+        yield parent
+        path, parent = parent, os.path.dirname(parent)
+
+
+@lru_cache(maxsize=None)
+def _find_env(cwd: str) -> Optional[str]:
+    """Return the path of the nearest .env file for a working directory."""
+    # Look for .env in current directory and parent directories, stopping at
+    # the first hit
+    for directory in _ancestors(cwd):
+        env_file = os.path.join(directory, ".env")
+        if os.path.isfile(env_file):
+            return env_file
 
     # Also look in the commit-gpt installation directory
-    try:
-        import commit_gpt
+    if _INSTALL_DIR is not None:
+        env_file = os.path.join(_INSTALL_DIR, ".env")
+        if os.path.isfile(env_file):
+            return env_file
+    return None
 
-        commit_gpt_dir = Path(commit_gpt.__file__).parent.parent.parent
-        search_dirs.append(commit_gpt_dir)
-    except ImportError:
-        pass
 
-    for parent in search_dirs:
-        env_file = parent / ".env"
-        if env_file.exists():
-            try:
-                with open(env_file, "r") as f:
-                    for line in f:
-                        line = line.strip()
-                        if line and not line.startswith("#") and "=" in line:
-                            key, value = line.split("=", 1)
-                            os.environ[key.strip()] = value.strip()
-                return True
-            except Exception:
-                pass
-    return False
+def _parse_env(env_file: str) -> dict:
+    """Parse KEY=VALUE pairs from a .env file."""
+    values = {}
+    for line in Path(env_file).read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith("#") and "=" in line:
+            key, value = line.split("=", 1)
+            values[key.strip()] = value.strip()
+    return values
 
 
-app = typer.Typer(add_completion=False, help="AI-powered git commit message generator")
+def load_env_file():
+    """Automatically load .env file if it exists."""
+    # Nothing to do if the environment is already configured
+    if all(key in os.environ for key in _ENV_KEYS):
+        return True
 
+    env_file = _find_env(os.getcwd())
+    if env_file is None:
+        return False
+
+    try:
+        # Values already set in the environment take precedence over .env
+        for key, value in _parse_env(env_file).items():
+            os.environ.setdefault(key, value)
+        return True
+    except Exception:
+        return False
 
-class CommitOutput(BaseModel):
-    """Output structure for commit messages."""
 
-    subject: str
-    body: Optional[str] = None
+app = typer.Typer(add_completion=False, help="AI-powered git commit message generator")
 
 
 @app.command()
@@ -96,54 +156,84 @@ def main(
     # Automatically load .env file if it exists
     load_env_file()
 
+    # Imported here so --help and argument errors don't pay for them
+    from concurrent.futures import ThreadPoolExecutor
+
+    from .formatters import enforce_limits, format_casual, format_conventional
+    from .llm import (
+        build_prompt,
+        have_llm,
+        is_diff_too_large_from_count,
+        parse_llm_response,
+        summarize_diff,
+    )
+    from .redact import estimate_tokens_batch, scrub_and_measure
+    from .risk import assess
+
     try:
-        # Get diff
-        if range:
-            diff = subprocess.check_output(
-                ["git", "diff", range, "--no-ext-diff", "-U3", "--minimal"],
-                text=True,
-                stderr=subprocess.PIPE,
-            )
+        # Repo metadata doesn't depend on the diff, so fetch it in the
+        # background while the diff is read and redacted
+        executor = ThreadPoolExecutor(max_workers=1)
+        repo_future = executor.submit(collect_context, n_subjects=5)
+        executor.shutdown(wait=False)
+
+        # Get diff. The common case only needs the redacted diff, so the staged
+        # diff is streamed straight into redaction instead of held in memory.
+        if range or risk_check:
+            raw_diff = range_diff(range) if range else staged_diff()
+
+            # Risk assessment
+            if risk_check:
+                risk = assess(raw_diff)
+                if risk.score >= 0.7:
+                    typer.echo(risk.report, err=True)
+                    raise typer.Exit(2)
+
+            diff_lines: Iterable[str] = raw_diff.split("\n")
         else:
-            diff = staged_diff()
+            diff_lines = iter_staged_diff()
+
+        # Redact and size the diff in one pass; tiktoken only runs when the
+        # cheap upper bound can't rule out a very large diff. The size is an
+        # exact token count above _VERY_LARGE_TOKENS and a UTF-8 byte upper
+        # bound otherwise, so only report it as tokens above that threshold.
+        diff, redacted, token_count_or_bound, has_changes = scrub_and_measure(
+            diff_lines, exact_above=_VERY_LARGE_TOKENS
+        )
 
-        if not diff.strip():
+        # Judge emptiness before redaction, so changes that only touch
+        # excluded files (.env, keys, ...) can still be committed
+        if not has_changes:
             typer.echo("No diff to summarize.", err=True)
             raise typer.Exit(1)
 
-        # Risk assessment
-        risk = assess(diff)
-        if risk_check and risk.score >= 0.7:
-            typer.echo(risk.report, err=True)
-            raise typer.Exit(2)
+        if explain and redacted:
+            typer.echo("[explain] Secrets or excluded files were redacted from the diff", err=True)
 
         # Build context
+        repo_ctx = repo_future.result()
         ctx = {
-            "repo": repo_name(),
-            "branch": current_branch(),
-            "subjects": recent_subjects(5),
-            "diff": scrub(diff),
+            "repo": repo_ctx.repo,
+            "branch": repo_ctx.branch,
+            "subjects": repo_ctx.subjects,
+            "diff": diff,
             "purpose": purpose,  # Add user-provided purpose
         }
 
         # Generate commit message
         use_llm = have_llm() and not no_llm
-        diff = ctx.get("diff", "")
 
         # Get max cost from environment if not provided
         if max_cost is None:
-            import os
-
             max_cost = float(os.getenv("COMMIT_GPT_MAX_COST", "0.02"))
 
         # Check if diff is too large for safe AI processing
-        estimated_tokens = estimate_tokens(diff)
-        is_too_large = is_diff_too_large(diff)
+        is_too_large = is_diff_too_large_from_count(token_count_or_bound)
 
         if is_too_large and not no_llm:
             if explain:
                 typer.echo(
-                    f"[explain] Large diff detected ({estimated_tokens} tokens). Using offline mode for reliability.",
+                    f"[explain] Large diff detected ({token_count_or_bound} tokens). Using offline mode for reliability.",
                     err=True,
                 )
                 typer.echo(
@@ -165,44 +255,31 @@ def main(
         if suggest_groups and is_too_large:
             groups = suggest_commit_groups(diff)
 
-            typer.echo(
-                typer.style("[INFO]", fg=typer.colors.BLUE, bold=True)
-                + f" Large diff detected ({estimated_tokens} tokens). Suggested commit groups:",
-                err=True,
-            )
-            typer.echo("", err=True)
-
-            for i, group in enumerate(groups, 1):
-                group_files = group["files"]
-                group_diff = group["diff"]
-                group_tokens = estimate_tokens(group_diff)
-
-                typer.echo(f"Group {i} ({group_tokens} tokens):", err=True)
-                typer.echo(f"  Files: {', '.join(group_files)}", err=True)
-                typer.echo("", err=True)
-
-            typer.echo(
-                typer.style("[HELP]", fg=typer.colors.GREEN, bold=True)
-                + " To commit each group separately:",
-                err=True,
-            )
-            typer.echo("  1. git reset HEAD~  # Unstage all changes", err=True)
-            typer.echo("  2. Stage files for each group: git add <files>", err=True)
-            typer.echo("  3. Run commit-gpt for each group", err=True)
-
-            typer.echo("", err=True)
-            typer.echo(
-                typer.style("[TIP]", fg=typer.colors.YELLOW, bold=True)
-                + f" Large commits like this ({estimated_tokens} tokens) make code review harder",
-                err=True,
-            )
-            typer.echo(
+            group_tokens = estimate_tokens_batch([group["diff"] for group in groups])
+
+            # Build the whole report and emit it as a single write
+            lines = [
+                _INFO
+                + f" Large diff detected ({token_count_or_bound} tokens). Suggested commit groups:",
+                "",
+            ]
+            for i, (group, tokens) in enumerate(zip(groups, group_tokens), 1):
+                lines.append(f"Group {i} ({tokens} tokens):")
+                lines.append(f"  Files: {', '.join(group['files'])}")
+                lines.append("")
+
+            lines += [
+                _HELP + " To commit each group separately:",
+                "  1. git reset HEAD~  # Unstage all changes",
+                "  2. Stage files for each group: git add <files>",
+                "  3. Run commit-gpt for each group",
+                "",
+                _TIP
+                + f" Large commits like this ({token_count_or_bound} tokens) make code review harder",
                 "      and can hide important changes. Consider making smaller, focused commits",
-                err=True,
-            )
-            typer.echo(
-                "      as you work - it makes debugging and collaboration much easier!", err=True
-            )
+                "      as you work - it makes debugging and collaboration much easier!",
+            ]
+            typer.echo("\n".join(lines), err=True)
             return
 
         # Debug: Check if we got a valid subject
@@ -211,34 +288,24 @@ def main(
             raise typer.Exit(1)
 
         # Check if this is a very large diff with a poor commit message
-        very_large_threshold = 8000  # tokens
-        is_very_large = estimated_tokens > very_large_threshold
-        poor_message_indicators = ["add .env", "update files", "modify", "add", "update", "change"]
-        has_poor_message = any(
-            indicator in subject.lower() for indicator in poor_message_indicators
-        )
+        is_very_large = token_count_or_bound > _VERY_LARGE_TOKENS
+        has_poor_message = _POOR_MSG_RE.search(subject) is not None
 
         # Prevent writing poor commit messages for very large diffs
         if is_very_large and has_poor_message and write and not force_write:
-            typer.echo(
-                typer.style("[WARNING]", fg=typer.colors.RED, bold=True)
-                + f" Refusing to write commit for very large diff ({estimated_tokens} tokens).",
-                err=True,
-            )
-            typer.echo("", err=True)
-            typer.echo(
+            lines = [
+                _WARNING
+                + f" Refusing to write commit for very large diff ({token_count_or_bound} tokens).",
+                "",
                 f"The generated message '{subject}' is too generic for such a large change.",
-                err=True,
-            )
-            typer.echo("", err=True)
-            typer.echo(
-                typer.style("[HELP]", fg=typer.colors.GREEN, bold=True) + " Recommended actions:",
-                err=True,
-            )
-            typer.echo("  1. Use --suggest-groups to split into focused commits", err=True)
-            typer.echo("  2. Use --explain to see what's happening", err=True)
-            typer.echo("  3. Use --force-write if you really want this message", err=True)
-            typer.echo("", err=True)
+                "",
+                _HELP + " Recommended actions:",
+                "  1. Use --suggest-groups to split into focused commits",
+                "  2. Use --explain to see what's happening",
+                "  3. Use --force-write if you really want this message",
+                "",
+            ]
+            typer.echo("\n".join(lines), err=True)
             raise typer.Exit(1)
 
         # Handle amend mode - edit cached commit message
@@ -270,7 +337,6 @@ def main(
                     msg += f"\n\n{response.body}"
 
                 # Write to temporary file
-                import os
                 import tempfile
 
                 with tempfile.NamedTemporaryFile(mode="w", suffix=".txt", delete=False) as f:
@@ -351,7 +417,17 @@ def main(
         # Write to git if requested
         if write:
             msg = subject + (f"\n\n{body}" if body else "")
-            subprocess.run(["git", "commit", "-m", msg], check=False)
+            commit_id = commit_staged(msg)
+            if commit_id:
+                typer.echo(f"[{commit_id[:7]}] {subject}")
+            elif os.getenv("COMMIT_GPT_EXEC") == "1":
+                # Hand the process over to git; nothing runs after this,
+                # including atexit handlers, so flush our output first
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os.execvp("git", ["git", "commit", "-m", msg])
+            else:
+                subprocess.run(["git", "commit", "-m", msg], check=False)
 
     except subprocess.CalledProcessError as e:
         typer.echo(f"Git command failed: {e}", err=True)
@@ -1,26 +1,203 @@
 """Git operations and repository information."""
 
+import io
+import os
 import re
 import subprocess
-from typing import List
+from dataclasses import dataclass
+from functools import lru_cache
+from types import ModuleType
+from typing import Any, Iterator, List, Optional, Tuple
+
+
+@dataclass
+class RepoContext:
+    """Repository metadata used to build the prompt context."""
+
+    repo: str
+    branch: str
+    subjects: List[str]
+
+
+# Hooks git commit would run; if any are installed we must let git do the commit
+COMMIT_HOOKS = ("pre-commit", "prepare-commit-msg", "commit-msg", "post-commit")
+
+# Environment overrides honoured by git but not by libgit2's default signature
+SIGNATURE_ENV = (
+    "GIT_AUTHOR_NAME",
+    "GIT_AUTHOR_EMAIL",
+    "GIT_AUTHOR_DATE",
+    "GIT_COMMITTER_NAME",
+    "GIT_COMMITTER_EMAIL",
+    "GIT_COMMITTER_DATE",
+)
+
+# Process-wide cache of (cwd, n_subjects, RepoContext) filled by
+# collect_context(), which the CLI runs on a worker thread
+_context: Optional[Tuple[str, int, RepoContext]] = None
 
 
 def staged_diff() -> str:
     """Get the staged diff for the current repository."""
     try:
+        # Read bytes and decode once; text mode decodes in small chunks
         result = subprocess.run(
             ["git", "diff", "--staged", "--no-ext-diff", "-U3", "--minimal"],
             capture_output=True,
-            text=True,
             check=True,
         )
-        return result.stdout
+        return result.stdout.decode("utf-8", errors="replace")
     except subprocess.CalledProcessError:
         return ""
 
 
-def recent_subjects(count: int = 5) -> List[str]:
-    """Get recent commit subjects from git log."""
+def iter_staged_diff() -> Iterator[str]:
+    """Stream the staged diff line by line.
+
+    Yields the same lines as ``staged_diff().split("\\n")`` without ever
+    holding the whole diff in memory.
+    """
+    with subprocess.Popen(
+        ["git", "diff", "--staged", "--no-ext-diff", "-U3", "--minimal"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    ) as proc:
+        assert proc.stdout is not None
+        # Decode like staged_diff(): UTF-8, no newline translation
+        stdout = io.TextIOWrapper(proc.stdout, encoding="utf-8", errors="replace", newline="\n")
+        line = ""
+        for line in stdout:
+            yield line[:-1] if line.endswith("\n") else line
+        # str.split leaves an empty final item after a trailing newline
+        if line.endswith("\n") or not line:
+            yield ""
+
+
+def _load_pygit2() -> Optional[ModuleType]:
+    """Import pygit2 on first use, since it is optional and slow to import."""
+    try:
+        import pygit2
+    except Exception:  # pragma: no cover - optional dependency
+        return None
+    return pygit2
+
+
+@lru_cache(maxsize=None)
+def _repository(cwd: str) -> Any:
+    """Open the repository containing cwd with pygit2."""
+    pygit2 = _load_pygit2()
+    assert pygit2 is not None
+    return pygit2.Repository(pygit2.discover_repository(cwd))
+
+
+def _libgit2_range_diff(pygit2: ModuleType, rev_range: str) -> str:
+    """Diff a ``a..b`` or ``a...b`` range in-process with libgit2.
+
+    The patch matches git diff for ordinary changes; rename similarity
+    scores may differ slightly since libgit2 computes them its own way.
+    """
+    repo = _repository(os.getcwd())
+    symmetric = "..." in rev_range
+    left, right = rev_range.split("..." if symmetric else "..", 1)
+
+    # An empty side defaults to HEAD, as with git diff
+    a = repo.revparse_single(left or "HEAD").peel(pygit2.Commit)
+    b = repo.revparse_single(right or "HEAD").peel(pygit2.Commit)
+    if symmetric:
+        base = repo.merge_base(a.id, b.id)
+        if base is None:
+            raise ValueError(f"No merge base for {rev_range}")
+        a = repo[base]
+
+    diff = a.tree.diff_to_tree(b.tree, context_lines=3, flags=pygit2.GIT_DIFF_MINIMAL)
+    diff.find_similar()
+    patch: Optional[str] = diff.patch
+    return patch or ""
+
+
+def range_diff(rev_range: str) -> str:
+    """Get the diff for a git revision range."""
+    pygit2 = _load_pygit2() if ".." in rev_range else None
+    if pygit2 is not None:
+        try:
+            return _libgit2_range_diff(pygit2, rev_range)
+        except (pygit2.GitError, KeyError, ValueError):
+            # Let git itself handle anything libgit2 can't resolve
+            pass
+
+    raw = subprocess.check_output(
+        ["git", "diff", rev_range, "--no-ext-diff", "-U3", "--minimal"],
+        stderr=subprocess.PIPE,
+    )
+    return raw.decode("utf-8", errors="replace")
+
+
+def _needs_git_commit(repo: Any) -> bool:
+    """Check whether a commit needs behaviour only git itself provides."""
+    if any(key in os.environ for key in SIGNATURE_ENV):
+        return True
+
+    config = repo.config
+    if "commit.gpgsign" in config and config.get_bool("commit.gpgsign"):
+        return True
+
+    # Linked worktrees keep their hooks in the common git dir
+    git_dir = repo.path
+    commondir_file = os.path.join(git_dir, "commondir")
+    if os.path.isfile(commondir_file):
+        with open(commondir_file, "r") as f:
+            git_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+
+    hooks_dir = os.path.join(git_dir, "hooks")
+    if "core.hooksPath" in config:
+        hooks_dir = os.path.join(
+            repo.workdir or repo.path, os.path.expanduser(config["core.hooksPath"])
+        )
+    return any(os.access(os.path.join(hooks_dir, hook), os.X_OK) for hook in COMMIT_HOOKS)
+
+
+def commit_staged(message: str) -> Optional[str]:
+    """Commit the staged changes in-process with libgit2.
+
+    Returns the new commit id, or None when the commit should be left to
+    git (pygit2 missing, hooks or signing configured, or nothing staged).
+    """
+    pygit2 = _load_pygit2()
+    if pygit2 is None:
+        return None
+
+    try:
+        repo = _repository(os.getcwd())
+        # Merges, cherry-picks etc. carry extra state only git commit handles
+        if repo.is_bare or repo.state() != pygit2.enums.RepositoryState.NONE:
+            return None
+        if _needs_git_commit(repo):
+            return None
+
+        index = repo.index
+        index.read()
+        tree = index.write_tree()
+
+        parents = []
+        if not repo.head_is_unborn:
+            head = repo.head.peel(pygit2.Commit)
+            if head.tree_id == tree:
+                # Nothing staged; let git report it
+                return None
+            parents = [head.id]
+
+        # Same cleanup git applies to -m messages
+        message = "\n".join(line.rstrip() for line in message.strip().split("\n"))
+        message = re.sub(r"\n{3,}", "\n\n", message) + "\n"
+        signature = repo.default_signature
+        oid = repo.create_commit("HEAD", signature, signature, message, tree, parents)
+        return str(oid)
+    except (pygit2.GitError, KeyError, ValueError):
+        return None
+
+
+def _log_subjects(count: int) -> List[str]:
+    """Run git log and return up to count commit subjects."""
     try:
         result = subprocess.run(
             ["git", "log", f"-{count}", "--pretty=format:%s"],
@@ -33,8 +210,73 @@ def recent_subjects(count: int = 5) -> List[str]:
         return []
 
 
+def _origin_url() -> Optional[str]:
+    """Get the origin remote URL as git resolves it (insteadOf, includes)."""
+    try:
+        result = subprocess.run(
+            ["git", "remote", "get-url", "origin"], capture_output=True, text=True, check=True
+        )
+        return result.stdout.strip()
+    except subprocess.CalledProcessError:
+        return None
+
+
+def _name_from_url(url: str) -> str:
+    """Extract the repository name from a remote URL."""
+    # Extract repo name from various URL formats
+    if url.endswith(".git"):
+        url = url[:-4]
+    if "/" in url:
+        return url.split("/")[-1]
+    return "unknown"
+
+
+def _cached_context() -> Optional[Tuple[str, int, RepoContext]]:
+    """Return the cached context if it was collected in the current directory."""
+    if _context is not None and _context[0] == os.getcwd():
+        return _context
+    return None
+
+
+def collect_context(n_subjects: int = 5) -> RepoContext:
+    """Gather repo name, branch and recent subjects in one go.
+
+    The CLI calls this on a worker thread while the diff is processed. The
+    result is cached for the process so the individual helpers below can
+    reuse it instead of spawning git again.
+    """
+    global _context
+    cached = _cached_context()
+    if cached is not None and cached[1] >= n_subjects:
+        return cached[2]
+
+    result = subprocess.run(
+        ["git", "rev-parse", "--abbrev-ref", "HEAD"], capture_output=True, text=True
+    )
+    url = _origin_url()
+    context = RepoContext(
+        repo=_name_from_url(url) if url else "unknown",
+        branch=result.stdout.strip() if result.returncode == 0 else "unknown",
+        subjects=_log_subjects(n_subjects),
+    )
+
+    _context = (os.getcwd(), n_subjects, context)
+    return context
+
+
+def recent_subjects(count: int = 5) -> List[str]:
+    """Get recent commit subjects from git log."""
+    cached = _cached_context()
+    if cached is not None and cached[1] >= count:
+        return cached[2].subjects[:count]
+    return _log_subjects(count)
+
+
 def current_branch() -> str:
     """Get the current branch name."""
+    cached = _cached_context()
+    if cached is not None:
+        return cached[2].branch
     try:
         result = subprocess.run(
             ["git", "rev-parse", "--abbrev-ref", "HEAD"], capture_output=True, text=True, check=True
@@ -46,17 +288,14 @@ def current_branch() -> str:
 
 def repo_name() -> str:
     """Get the repository name from git remote."""
+    cached = _cached_context()
+    if cached is not None:
+        return cached[2].repo
     try:
         result = subprocess.run(
             ["git", "remote", "get-url", "origin"], capture_output=True, text=True, check=True
         )
-        url = result.stdout.strip()
-        # Extract repo name from various URL formats
-        if url.endswith(".git"):
-            url = url[:-4]
-        if "/" in url:
-            return url.split("/")[-1]
-        return "unknown"
+        return _name_from_url(result.stdout.strip())
     except subprocess.CalledProcessError:
         return "unknown"
 
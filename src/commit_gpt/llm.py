@@ -7,7 +7,7 @@ import sqlite3
 from dataclasses import dataclass
 from typing import Dict, Optional, Tuple
 
-from .redact import estimate_tokens, truncate_for_tokens
+from .redact import estimate_tokens, token_upper_bound, truncate_for_tokens
 
 
 @dataclass
@@ -213,9 +213,16 @@ def get_provider() -> Optional[LLMProvider]:
 
 def is_diff_too_large(diff: str, max_tokens: int = 30000) -> bool:
     """Check if a diff is too large for safe AI processing."""
-    # Estimate tokens for the diff plus some overhead for prompt
-    estimated_tokens = estimate_tokens(diff) + 500  # Add 500 tokens for prompt overhead
-    return estimated_tokens > max_tokens
+    # Skip tokenizing when even the upper bound fits
+    if not is_diff_too_large_from_count(token_upper_bound(diff), max_tokens):
+        return False
+    return is_diff_too_large_from_count(estimate_tokens(diff), max_tokens)
+
+
+def is_diff_too_large_from_count(token_count: int, max_tokens: int = 30000) -> bool:
+    """Check if a diff with an already-computed token count is too large."""
+    # Add 500 tokens of overhead for the prompt
+    return token_count + 500 > max_tokens
 
 
 def build_prompt(ctx: Dict, style: str = "conventional") -> str:
@@ -278,14 +285,10 @@ def summarize_diff(
     ctx: Dict, style: str = "conventional", max_cost: float = 0.02
 ) -> Tuple[LLMResponse, str, float]:
     """Generate commit message using LLM."""
-    provider = get_provider()
-    if not provider:
-        raise Exception("No LLM provider configured")
-
     # Build prompt
     prompt = build_prompt(ctx, style)
 
-    # Check cache
+    # Check cache before creating a provider, so a hit never loads an SDK
     cache = Cache()
     cached = cache.get(prompt)
     if cached:
@@ -293,6 +296,10 @@ def summarize_diff(
         response = parse_llm_response(response_text, ctx)
         return response, "Using cached response", cost
 
+    provider = get_provider()
+    if not provider:
+        raise Exception("No LLM provider configured")
+
     # Truncate if needed
     prompt = truncate_for_tokens(prompt, 15000)
 
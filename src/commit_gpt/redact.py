@@ -1,6 +1,9 @@
 """Redaction utilities for scrubbing sensitive data from diffs."""
 
+import os
 import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
 
 try:
     import tiktoken
@@ -49,63 +52,153 @@ EXCLUDED_FILES = [
 ]
 
 
+# Secret patterns are compiled once but applied in turn, since a combined
+# alternation would let one match swallow the start of an overlapping secret
+_SECRET_RES = [re.compile(pattern, re.IGNORECASE) for pattern in SECRET_PATTERNS]
+_EXCLUDED_RE = re.compile("|".join(f"(?:{pattern})" for pattern in EXCLUDED_FILES))
+
+
 def scrub(diff: str, max_lines_per_file: int = 50) -> str:
     """Scrub sensitive information from a git diff."""
+    return scrub_with_status(diff, max_lines_per_file)[0]
+
+
+def scrub_with_status(diff: str, max_lines_per_file: int = 50) -> Tuple[str, bool]:
+    """Scrub a git diff and report whether anything was redacted or dropped.
+
+    When nothing changes the original string is returned as-is.
+    """
     if not diff.strip():
-        return diff
+        return diff, False
+
+    scrubbed, changed = scrub_lines(diff.split("\n"), max_lines_per_file)
+    return (scrubbed, True) if changed else (diff, False)
+
+
+def scrub_lines(lines: Iterable[str], max_lines_per_file: int = 50) -> Tuple[str, bool]:
+    """Scrub diff lines (without newlines) as they arrive, e.g. from a pipe.
+
+    Returns the scrubbed diff and whether anything was redacted or dropped.
+    """
+    scrubbed_lines, redacted, truncated, _, _ = _scrub(lines, max_lines_per_file)
+    return "\n".join(scrubbed_lines), redacted or truncated
 
-    lines = diff.split("\n")
+
+def scrub_and_measure(
+    lines: Iterable[str], max_lines_per_file: int = 50, exact_above: int = 0
+) -> Tuple[str, bool, int, bool]:
+    """Scrub diff lines and size the result in the same pass.
+
+    Returns the scrubbed diff, whether any secrets or excluded files were
+    removed (truncation alone doesn't count), its token count, and whether
+    the input had any non-blank lines before scrubbing. The count is only
+    run through tiktoken when the upper bound gathered while scrubbing
+    exceeds exact_above; otherwise the bound itself is returned.
+    """
+    scrubbed_lines, redacted, _, upper_bound, has_input = _scrub(lines, max_lines_per_file)
+    scrubbed = "\n".join(scrubbed_lines)
+    if upper_bound > exact_above:
+        return scrubbed, redacted, estimate_tokens(scrubbed), has_input
+    return scrubbed, redacted, upper_bound, has_input
+
+
+def _scrub(
+    lines: Iterable[str], max_lines_per_file: int
+) -> Tuple[List[str], bool, bool, int, bool]:
+    """Scrub diff lines.
+
+    Returns the scrubbed lines, redacted and truncated flags, a token upper
+    bound, and whether any input line was non-blank.
+    """
     scrubbed_lines = []
+    has_input = False
     current_file = None
     file_line_count = 0
     skip_file = False
+    redacted = False
+    truncated = False
+    # Newlines between lines, plus each line's size (see token_upper_bound)
+    upper_bound = -1
 
     for line in lines:
+        if not has_input and line.strip():
+            has_input = True
+
         if line.startswith("diff --git"):
-            skip_file = any(re.search(pattern, line) for pattern in EXCLUDED_FILES)
+            skip_file = _EXCLUDED_RE.search(line) is not None
             if skip_file:
                 current_file = None
+                redacted = True
                 continue
             current_file = line
             file_line_count = 0
-            scrubbed_lines.append(line)
-            continue
-
-        if skip_file:
-            continue
-
-        if line.startswith("+++") or line.startswith("---"):
-            scrubbed_lines.append(line)
+        elif skip_file:
             continue
+        elif line.startswith("+++") or line.startswith("---"):
+            pass
+        elif current_file and file_line_count >= max_lines_per_file:
+            # Limit lines per file
+            if file_line_count != max_lines_per_file:
+                continue
+            line = "... (truncated)"
+            truncated = True
+        else:
+            # Scrub sensitive patterns
+            for secret_re in _SECRET_RES:
+                line, count = secret_re.subn("***REDACTED***", line)
+                if count:
+                    redacted = True
+            file_line_count += 1
 
-        # Limit lines per file
-        if current_file and file_line_count >= max_lines_per_file:
-            if file_line_count == max_lines_per_file:
-                scrubbed_lines.append("... (truncated)")
-            continue
+        scrubbed_lines.append(line)
+        upper_bound += 1 + token_upper_bound(line)
 
-        # Scrub sensitive patterns
-        scrubbed_line = line
-        for pattern in SECRET_PATTERNS:
-            scrubbed_line = re.sub(pattern, "***REDACTED***", scrubbed_line, flags=re.IGNORECASE)
+    return scrubbed_lines, redacted, truncated, max(upper_bound, 0), has_input
 
-        scrubbed_lines.append(scrubbed_line)
-        file_line_count += 1
 
-    return "\n".join(scrubbed_lines)
+@lru_cache(maxsize=1)
+def _encoding() -> "Optional[tiktoken.Encoding]":
+    """Load the tiktoken encoding once, or None if it is unavailable."""
+    try:
+        # Use GPT-3.5-turbo tokenizer (closest to what we're using)
+        return tiktoken.encoding_for_model("gpt-3.5-turbo")
+    except Exception:
+        return None
 
 
 def estimate_tokens(text: str) -> int:
     """Estimate token count using tiktoken."""
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4
     try:
-        # Use GPT-3.5-turbo tokenizer (closest to what we're using)
-        encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
         return len(encoding.encode(text))
     except Exception:
         # Fallback to rough approximation: 1 token ≈ 4 characters
         return len(text) // 4
 
 
+def token_upper_bound(text: str) -> int:
+    """Cheap upper bound on the token count of text, without tokenizing it.
+
+    tiktoken's byte-level BPE never produces more tokens than UTF-8 bytes,
+    and the len // 4 fallback is smaller still.
+    """
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+def estimate_tokens_batch(texts: List[str]) -> List[int]:
+    """Estimate token counts for several texts in a single tiktoken call."""
+    encoding = _encoding()
+    if encoding is None:
+        return [len(text) // 4 for text in texts]
+    try:
+        encoded = encoding.encode_batch(texts, num_threads=os.cpu_count() or 1)
+        return [len(tokens) for tokens in encoded]
+    except Exception:
+        return [estimate_tokens(text) for text in texts]
+
+
 def truncate_for_tokens(text: str, max_tokens: int = 4000) -> str:
     """Truncate text to stay within token limits."""
     estimated_tokens = estimate_tokens(text)
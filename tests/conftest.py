@@ -1,5 +1,21 @@
+import subprocess
 import sys
 from pathlib import Path
 
+import pytest
+
 # Ensure the src directory is on the path for tests
 sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+
+@pytest.fixture
+def git_repo(tmp_path, monkeypatch):
+    """Create a git repository on branch main with an identity and cd into it."""
+    monkeypatch.chdir(tmp_path)
+    for args in (
+        ["init", "-q", "-b", "main"],
+        ["config", "user.name", "Tester"],
+        ["config", "user.email", "tester@example.com"],
+    ):
+        subprocess.run(["git", *args], check=True, capture_output=True)
+    return tmp_path
@@ -0,0 +1,99 @@
+"""Tests for CLI helpers."""
+
+import os
+import subprocess
+
+from typer.testing import CliRunner
+
+from commit_gpt import cli
+
+
+def test_load_env_file_from_parent(tmp_path, monkeypatch):
+    (tmp_path / ".env").write_text("# comment\nCOMMIT_GPT_TEST_KEY = value\n")
+    nested = tmp_path / "a" / "b"
+    nested.mkdir(parents=True)
+    monkeypatch.chdir(nested)
+    monkeypatch.delenv("COMMIT_GPT_MAX_COST", raising=False)
+    monkeypatch.delenv("COMMIT_GPT_TEST_KEY", raising=False)
+    cli._find_env.cache_clear()
+
+    assert cli.load_env_file()
+    assert os.environ["COMMIT_GPT_TEST_KEY"] == "value"
+    assert cli._find_env(str(nested)) == str(tmp_path / ".env")
+
+
+def test_load_env_file_skips_when_configured(tmp_path, monkeypatch):
+    (tmp_path / ".env").write_text("COMMIT_GPT_TEST_KEY=value\n")
+    monkeypatch.chdir(tmp_path)
+    for key in cli._ENV_KEYS:
+        monkeypatch.setenv(key, "set")
+    monkeypatch.delenv("COMMIT_GPT_TEST_KEY", raising=False)
+
+    assert cli.load_env_file()
+    assert "COMMIT_GPT_TEST_KEY" not in os.environ
+
+
+def test_load_env_file_applies_unset_keys(tmp_path, monkeypatch):
+    (tmp_path / ".env").write_text(
+        "COMMIT_GPT_OPENAI_MODEL=gpt-4o-mini\nCOMMIT_GPT_MAX_COST=1.00\n"
+    )
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENAI_API_KEY", "set")
+    monkeypatch.setenv("COMMIT_GPT_MAX_COST", "0.05")
+    monkeypatch.delenv("COMMIT_GPT_OPENAI_MODEL", raising=False)
+    cli._find_env.cache_clear()
+
+    assert cli.load_env_file()
+    assert os.environ["COMMIT_GPT_OPENAI_MODEL"] == "gpt-4o-mini"
+    assert os.environ["COMMIT_GPT_MAX_COST"] == "0.05"
+
+
+def test_install_dir_skipped_for_zip_imports(tmp_path, monkeypatch):
+    import zipfile
+
+    archive = tmp_path / "pkg.zip"
+    zipfile.ZipFile(archive, "w").close()
+    monkeypatch.setattr(cli.importlib.resources, "files", lambda package: zipfile.Path(archive))
+    assert cli._install_dir() is None
+
+    monkeypatch.setattr(cli, "_INSTALL_DIR", None)
+    monkeypatch.chdir(tmp_path)
+    cli._find_env.cache_clear()
+    assert cli._find_env(str(tmp_path)) is None
+    cli._find_env.cache_clear()
+
+
+def test_poor_message_pattern():
+    assert cli._POOR_MSG_RE.search("Update files")
+    assert cli._POOR_MSG_RE.search("chore: add .env")
+    assert not cli._POOR_MSG_RE.search("fix: validate email address")
+
+
+def test_ancestors():
+    assert list(cli._ancestors("/a/b")) == ["/a/b", "/a", "/"]
+    assert list(cli._ancestors("/")) == ["/"]
+
+
+def test_write_falls_back_to_git_commit(git_repo, monkeypatch):
+    (git_repo / "app.py").write_text("print('hi')\n")
+    subprocess.run(["git", "add", "app.py"], check=True)
+    # Force the git commit path, as when pygit2 is missing or hooks are installed
+    monkeypatch.setattr(cli, "commit_staged", lambda message: None)
+
+    result = CliRunner().invoke(cli.app, ["--no-llm", "--write", "--max-$", "0.05"])
+
+    assert result.exit_code == 0, result.output
+    log = subprocess.check_output(["git", "log", "--format=%s"], text=True)
+    assert log.strip() == result.stdout.splitlines()[0]
+
+
+def test_write_commits_changes_to_excluded_files(git_repo, monkeypatch):
+    (git_repo / "config.json").write_text('{"debug": true}\n')
+    subprocess.run(["git", "add", "config.json"], check=True)
+    monkeypatch.setattr(cli, "commit_staged", lambda message: None)
+
+    # The redacted diff is empty, but there are still staged changes to commit
+    result = CliRunner().invoke(cli.app, ["--no-llm", "--write", "--max-$", "0.05"])
+
+    assert result.exit_code == 0, result.output
+    assert subprocess.check_output(["git", "status", "--porcelain"], text=True) == ""
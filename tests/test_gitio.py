@@ -0,0 +1,110 @@
+"""Tests for git helpers."""
+
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from commit_gpt import gitio
+
+
+def _git(*args):
+    subprocess.run(["git", *args], check=True, capture_output=True)
+
+
+def test_collect_context(git_repo, monkeypatch):
+    monkeypatch.setattr(gitio, "_context", None)
+    # The name must come from the URL as git resolves it, not the raw config
+    _git("config", "url.git@github.com:owner/.insteadOf", "gh:")
+    _git("remote", "add", "origin", "gh:project.git")
+    for subject in ["first", "second"]:
+        _git("commit", "-q", "--allow-empty", "-m", subject)
+
+    # The CLI collects context on a worker thread; helpers must still see it
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        context = executor.submit(gitio.collect_context, n_subjects=5).result()
+
+    assert context.repo == "project"
+    assert context.branch == "main"
+    assert context.subjects == ["second", "first"]
+
+    def no_git(*args, **kwargs):
+        raise AssertionError("helpers should reuse the cached context")
+
+    monkeypatch.setattr(gitio.subprocess, "run", no_git)
+    assert gitio.repo_name() == "project"
+    assert gitio.current_branch() == "main"
+    assert gitio.recent_subjects(1) == ["second"]
+
+
+def test_range_diff_matches_git(git_repo, monkeypatch):
+    pytest.importorskip("pygit2")
+    (git_repo / "app.py").write_text("print('one')\n")
+    _git("add", "app.py")
+    _git("commit", "-q", "-m", "first")
+    (git_repo / "app.py").write_text("print('one')\nprint('two')\n")
+    _git("commit", "-q", "-am", "second")
+
+    expected = {
+        rev_range: subprocess.check_output(
+            ["git", "diff", rev_range, "--no-ext-diff", "-U3", "--minimal"], text=True
+        )
+        for rev_range in ["HEAD~1..HEAD", "HEAD~1...HEAD"]
+    }
+
+    # Ranges must be diffed with libgit2, not the git fallback
+    def no_git(*args, **kwargs):
+        raise AssertionError("range_diff should not spawn git")
+
+    monkeypatch.setattr(gitio.subprocess, "check_output", no_git)
+    for rev_range, diff in expected.items():
+        assert gitio.range_diff(rev_range) == diff
+
+
+def test_commit_staged(git_repo):
+    pytest.importorskip("pygit2")
+    (git_repo / "app.py").write_text("print('one')\n")
+    _git("add", "app.py")
+
+    commit_id = gitio.commit_staged("feat: add app  \n\n\n\n- first line\n")
+
+    log = subprocess.check_output(["git", "log", "-1", "--format=%H%n%an%n%B"], text=True)
+    assert log == f"{commit_id}\nTester\nfeat: add app\n\n- first line\n\n"
+    assert subprocess.check_output(["git", "status", "--porcelain"], text=True) == ""
+
+    # Nothing staged now, so the commit is left to git
+    assert gitio.commit_staged("chore: nothing") is None
+
+
+def test_commit_staged_defers_to_hooks(git_repo, monkeypatch):
+    pytest.importorskip("pygit2")
+    hook = git_repo / ".git" / "hooks" / "commit-msg"
+    hook.write_text("#!/bin/sh\nexit 0\n")
+    hook.chmod(0o755)
+    (git_repo / "app.py").write_text("print('one')\n")
+    _git("add", "app.py")
+
+    assert gitio.commit_staged("feat: add app") is None
+
+    # Linked worktrees share the main repository's hooks
+    _git("commit", "-q", "--no-verify", "-m", "feat: add app")
+    worktree = git_repo.parent / f"{git_repo.name}-worktree"
+    _git("worktree", "add", "-q", "-b", "feature", str(worktree))
+    monkeypatch.chdir(worktree)
+    (worktree / "app.py").write_text("print('two')\n")
+    _git("add", "app.py")
+
+    assert gitio.commit_staged("feat: change app") is None
+
+    # Without the hook the same commit goes through libgit2
+    hook.chmod(0o644)
+    assert gitio.commit_staged("feat: change app") is not None
+
+
+def test_iter_staged_diff_matches_staged_diff(git_repo):
+    assert list(gitio.iter_staged_diff()) == [""]
+
+    (git_repo / "app.py").write_text("print('one')\nprint('two')\n")
+    _git("add", "app.py")
+
+    assert list(gitio.iter_staged_diff()) == gitio.staged_diff().split("\n")
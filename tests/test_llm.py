@@ -0,0 +1,38 @@
+"""Tests for LLM helpers."""
+
+from commit_gpt import llm
+from commit_gpt.llm import Cache, is_diff_too_large, is_diff_too_large_from_count
+from commit_gpt.redact import estimate_tokens
+
+
+def test_is_diff_too_large_from_count():
+    assert not is_diff_too_large_from_count(100)
+    assert is_diff_too_large_from_count(29600)
+    assert is_diff_too_large_from_count(200, max_tokens=500)
+
+
+def test_is_diff_too_large_matches_count():
+    diff = "+line of code\n" * 200
+    for max_tokens in (500, 5000):
+        assert is_diff_too_large(diff, max_tokens) == is_diff_too_large_from_count(
+            estimate_tokens(diff), max_tokens
+        )
+
+
+def test_summarize_diff_cache_hit_skips_provider(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "cache.db")
+    monkeypatch.setattr(llm, "Cache", lambda: Cache(db_path))
+
+    def no_provider():
+        raise AssertionError("provider should not be created on a cache hit")
+
+    monkeypatch.setattr(llm, "get_provider", no_provider)
+
+    ctx = {"diff": "diff --git a/app.py b/app.py\n+print('hi')\n", "repo": "demo"}
+    Cache(db_path).set(llm.build_prompt(ctx), "SUBJECT: feat: greet users", 0.001)
+
+    response, rationale, cost = llm.summarize_diff(ctx)
+
+    assert response.subject == "feat: greet users"
+    assert rationale == "Using cached response"
+    assert cost == 0.001
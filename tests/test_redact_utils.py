@@ -1,6 +1,19 @@
 """Additional tests for redaction utilities."""
 
-from commit_gpt.redact import get_redaction_summary, truncate_for_tokens
+import re
+
+from commit_gpt.redact import (
+    SECRET_PATTERNS,
+    estimate_tokens,
+    estimate_tokens_batch,
+    get_redaction_summary,
+    scrub,
+    scrub_and_measure,
+    scrub_lines,
+    scrub_with_status,
+    token_upper_bound,
+    truncate_for_tokens,
+)
 
 
 def test_truncate_for_tokens():
@@ -17,3 +30,81 @@ def test_get_redaction_summary():
     assert summary["original_lines"] == 2
     assert summary["scrubbed_lines"] == 2
     assert summary["redacted_lines"] == 1
+
+
+def test_estimate_tokens_batch():
+    texts = ["first text", "a somewhat longer second text", ""]
+    assert estimate_tokens_batch(texts) == [estimate_tokens(text) for text in texts]
+
+
+def test_scrub_with_status():
+    clean = "diff --git a/app.py b/app.py\n+print('hi')\n"
+    scrubbed, changed = scrub_with_status(clean)
+    assert scrubbed is clean
+    assert not changed
+
+    secret = "diff --git a/app.py b/app.py\n+password = hunter2\n"
+    scrubbed, changed = scrub_with_status(secret)
+    assert "***REDACTED***" in scrubbed
+    assert changed
+
+
+def test_scrub_lines_matches_scrub():
+    diff = "diff --git a/app.py b/app.py\n+password = hunter2\n+ok = 1\n"
+    assert scrub_lines(iter(diff.split("\n"))) == (scrub(diff), True)
+
+
+def test_token_upper_bound():
+    for text in ["", "plain ascii diff +line", "naïve café 🚀"]:
+        assert token_upper_bound(text) >= estimate_tokens(text)
+
+
+def test_scrub_and_measure():
+    diff = "diff --git a/app.py b/app.py\n+password = hunter2\n+ok = 1\n"
+    lines = diff.split("\n")
+
+    scrubbed, changed, tokens, has_input = scrub_and_measure(lines)
+    assert (scrubbed, changed) == scrub_lines(lines)
+    assert tokens == estimate_tokens(scrubbed)
+    assert has_input
+
+    # Below the threshold the cheap upper bound is returned instead
+    _, _, bound, _ = scrub_and_measure(lines, exact_above=10_000)
+    assert bound == token_upper_bound(scrubbed)
+
+
+def test_scrub_matches_sequential_patterns():
+    def sequential(line):
+        for pattern in SECRET_PATTERNS:
+            line = re.sub(pattern, "***REDACTED***", line, flags=re.IGNORECASE)
+        return line
+
+    # Secrets whose matches overlap, so one pattern must not hide the next
+    lines = [
+        "+access_token=" + "a" * 33 + "postgresql://u:p@h/x",
+        "+password=eyJhbGciOi.eyJzdWIi.sig",
+        "+api_key: " + "b" * 40 + "AKIA" + "C" * 16,
+        "+aws_secret_access_key=mysql://root:pw@db/app",
+    ]
+    diff = "\n".join(["diff --git a/app.py b/app.py"] + lines)
+    assert scrub(diff).split("\n")[1:] == [sequential(line) for line in lines]
+    assert "u:p@h" not in scrub(diff)
+
+
+def test_scrub_and_measure_ignores_truncation():
+    diff = "diff --git a/app.py b/app.py\n" + "\n".join(f"+line {i}" for i in range(5))
+    scrubbed, redacted, _, _ = scrub_and_measure(diff.split("\n"), max_lines_per_file=2)
+    assert scrubbed.endswith("... (truncated)")
+    assert not redacted
+    assert scrub_with_status(diff, max_lines_per_file=2)[1]
+
+
+def test_scrub_and_measure_reports_input_before_redaction():
+    # A diff of only excluded files scrubs to nothing but is not empty
+    diff = "diff --git a/.env b/.env\n+OPENAI_API_KEY=sk-test\n"
+    scrubbed, redacted, _, has_input = scrub_and_measure(diff.split("\n"))
+    assert scrubbed == ""
+    assert redacted
+    assert has_input
+
+    assert not scrub_and_measure([""])[3]